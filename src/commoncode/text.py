@@ -30,6 +30,8 @@ import re
 import logging
 import unicodedata
 
+from commoncode.functional import memoize
+
 """
 A text processing module providing functions to process and prepare text 
 before indexing or fingerprinting such as:
@@ -192,6 +194,15 @@ def python_safe_name(s):
     >>> python_safe_name(s)
     'not_good_safe_name'
 
+    """
+    return _python_safe_name(s)
+
+
+@memoize
+def _python_safe_name(s):
+    """
+    Return a name derived from string `s` safe to use as a Python identifier.
+    Results are cached as this is often called repeatedly with the same strings.
     """
     s = toascii(s)
     s = foldcase(s)
@@ -209,6 +209,13 @@ class LicenseIndex(object):
         # this is equivalent to a defaultdict(defaultdict(list))
         self.start_ngrams_by_rid = []
 
+        # mapping of starter ngram->[rule id, ...]
+        #
+        # This is the inverse of start_ngrams_by_rid such that a query ngram
+        # is looked up once for all the rules that start with it, rather than
+        # once for each candidate rule.
+        self.rids_by_start_ngram = {}
+
         # These are mappings of rid-> data as lists of data where the list index is the
         # rule id.
         #
@@ -266,6 +273,8 @@ class LicenseIndex(object):
 
         # accumulate all rule tokens at once. Also assign the rule ids
         tokens_by_rid = []
+        # tokenize identical rule texts only once
+        tokens_cache = {}
 
         regular_rids = set()
         regular_rids_add = regular_rids.add
@@ -278,7 +287,7 @@ class LicenseIndex(object):
                 negative_rids_add(rid)
             else:
                 regular_rids_add(rid)
-            rule_tokens = list(rule.tokens())
+            rule_tokens = list(rule.tokens(_cache=tokens_cache))
             tokens_by_rid.append(rule_tokens)
             unique_tokens.update(rule_tokens)
 
@@ -291,8 +300,10 @@ class LicenseIndex(object):
         # for speed
         sparsify(dictionary)
 
-        # replace strings with token ids
-        rules_tokens_ids = [[dictionary[tok] for tok in rule_tok] for rule_tok in tokens_by_rid]
+        # replace strings with token ids: use compact arrays of 16 bits signed
+        # integers rather than lists of Python ints
+        rules_tokens_ids = [array('h', [dictionary[tok] for tok in rule_tok]) for rule_tok in tokens_by_rid]
+        del tokens_by_rid, tokens_cache
         len_tokens = len(tokens_by_tid)
 
         # Second pass: Optimize token ids based on frequencies and common words
@@ -312,7 +323,7 @@ class LicenseIndex(object):
         new_rules_tokens_ids = []
         # renumber old token ids to new
         for rule_token_ids in rules_tokens_ids:
-            new_rules_tokens_ids.append(array('h', (old_to_new[tid] for tid in rule_token_ids)))
+            new_rules_tokens_ids.append(array('h', [old_to_new[tid] for tid in rule_token_ids]))
 
         # Third pass: build index structures
         ####################################
@@ -329,6 +340,9 @@ class LicenseIndex(object):
         # mapping of rule_id -> mapping of starter ngrams -> [(start, end,), ...]
         start_ngrams_by_rid = [defaultdict(list) for _r in rules]
 
+        # mapping of starter ngram -> [rule_id, ...]
+        rids_by_start_ngram = defaultdict(list)
+
         bv_template = bitarray([0 for _t in tokens_by_tid])
 
         # build posting lists and other index structures
@@ -365,6 +379,8 @@ class LicenseIndex(object):
                 rid_starters[starter_ngram].append(start)
 
             sparsify(rid_starters)
+            for starter_ngram in rid_starters:
+                rids_by_start_ngram[starter_ngram].append(rid)
 
             # OPTIMIZED: for faster access to index: convert postings to arrays
             postings_by_rid[rid] = {key: array('h', value) for key, value in rid_postings.items()}
@@ -383,6 +399,9 @@ class LicenseIndex(object):
         self.frequencies_by_rid = frequencies_by_rid
         self.tokens_by_rid = new_rules_tokens_ids
         self.start_ngrams_by_rid = start_ngrams_by_rid
+        rids_by_start_ngram = dict(rids_by_start_ngram)
+        sparsify(rids_by_start_ngram)
+        self.rids_by_start_ngram = rids_by_start_ngram
         self.negative_rids = negative_rids
         self.regular_rids = regular_rids
         if optimize:
@@ -668,6 +687,7 @@ class LicenseIndex(object):
             sparsify(post)
         for start in idx.start_ngrams_by_rid:
             sparsify(start)
+        sparsify(idx.rids_by_start_ngram)
 
         return idx
 
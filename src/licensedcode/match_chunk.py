@@ -143,6 +143,29 @@ def match_chunks(idx, candidates, query_tokens, line_by_pos, _ngram_length=NGRAM
     return chunk_matches
 
 
+def matching_length(query_tokens, qstart, rule_tokens, istart):
+    """
+    Return the number of contiguous equal tokens at the start of the
+    `query_tokens` sequence sliced at `qstart` and the `rule_tokens` sequence
+    sliced at `istart`.
+
+    For example:
+    >>> matching_length([1, 2, 3, 4, 5], 1, [0, 2, 3, 9], 1)
+    2
+    >>> matching_length([1, 2, 3], 0, [1, 2, 3, 4], 0)
+    3
+    >>> matching_length([1, 2, 3], 0, [4], 0)
+    0
+    """
+    length = 0
+    # note that we do not izip_longest here
+    for qtok, itok in izip(islice(query_tokens, qstart, None), islice(rule_tokens, istart, None)):
+        if qtok != itok:
+            break
+        length += 1
+    return length
+
+
 def _match_chunk(idx, candidates, query_tokens, line_by_pos, _ngram_length=NGRAM_LENGTH):
     """
     Return a sequence of LicenseMatch by matching the longest possible
@@ -152,30 +175,31 @@ def _match_chunk(idx, candidates, query_tokens, line_by_pos, _ngram_length=NGRAM
     logger_debug('_match_chunk: start....')
 
     starters = idx.start_ngrams_by_rid
+    rids_by_start_ngram = idx.rids_by_start_ngram
     tokens_by_rid = idx.tokens_by_rid
 
+    # rank of each candidate rule id: rules are considered in the order of
+    # candidates for a given query ngram
+    rank_by_rid = {rid: rank for rank, (_dist, rid) in enumerate(candidates)}
+
     matches = []
     matches_append = matches.append
     for qngram, qstart in query_ngrams(query_tokens, _ngram_length):
-        for _dist, rid in candidates:
+        # lookup once the rules starting with this ngram, keeping only candidates
+        start_rids = rids_by_start_ngram.get(qngram)
+        if not start_rids:
+            continue
+        ranked_rids = sorted((rank_by_rid[rid], rid) for rid in start_rids if rid in rank_by_rid)
+
+        for _rank, rid in ranked_rids:
             matched_rule_ispans = []
             matched_rule_ispans_extend = matched_rule_ispans.extend
             rid_starters = starters[rid]
-            if not rid_starters:
-#                 logger_debug(' no rid_starters')
-                continue
-
-            istarts = rid_starters.get(qngram)
-            if DEBUG:
-                if istarts is not None:
-                    logger_debug(' _match_chunks: found rid_starters')
-                    logger_debug('  _match_chunks: qngram, qstart:', u' '.join(idx.tokens_by_tid[t] for t in qngram), qstart)
-                    logger_debug('  _match_chunks: rid_starters:', [(u' '.join(idx.tokens_by_tid[t] for t in key), values) for key, values in rid_starters.items()])
-
-            if istarts is None:
-                continue
-
+            istarts = rid_starters[qngram]
             if DEBUG:
+                logger_debug(' _match_chunks: found rid_starters')
+                logger_debug('  _match_chunks: qngram, qstart:', u' '.join(idx.tokens_by_tid[t] for t in qngram), qstart)
+                logger_debug('  _match_chunks: rid_starters:', [(u' '.join(idx.tokens_by_tid[t] for t in key), values) for key, values in rid_starters.items()])
                 logger_debug()
                 logger_debug(' _match_chunks: FOUND rid_starters istarts, qstart', istarts, qstart)
 
@@ -189,33 +213,13 @@ def _match_chunk(idx, candidates, query_tokens, line_by_pos, _ngram_length=NGRAM
                 istart_span = Span(istart, istart + _ngram_length - 1)
                 if any(istart_span in mrisp for mrisp in matched_rule_ispans):
                     continue
-                qtks = islice(query_tokens, qstart, None)
-                itks = islice(rule_tokens, istart, None)
-                # note that we do not izip_longest here
-                pos = -1
-                broke = False
-                for pos, qtok_itok in enumerate(izip(qtks, itks)):
-                    qtok, itok = qtok_itok
-                    if DEBUG:
-                        logger_debug('   _match_chunks: considering --> matched pos:', pos, 'token:', idx.tokens_by_tid[qtok])
-                    if qtok != itok:
-                        if DEBUG:
-                            logger_debug('    _match_chunks: BREAK: qtok != itok --> matched pos:', pos, 'qtoken:', idx.tokens_by_tid[qtok], 'itoken:', idx.tokens_by_tid[itok])
-                        broke = True
-                        break
-                if pos != -1:
+                matched_length = matching_length(query_tokens, qstart, rule_tokens, istart)
+                if matched_length:
                     # at worst we will have a match that is ngram_length long
                     if DEBUG:
-                        logger_debug('      _match_chunks: ==>pos != -1')
-                    if broke:
-                        offset_fix = 1
-                    else:
-                        offset_fix = 0
-
-                    if DEBUG:
-                        logger_debug('        _match_chunks: ==>pos qstart', qstart)
-                    qspans = [Span(qstart, qstart + pos - offset_fix)]
-                    ispans = [Span(istart, istart + pos - offset_fix)]
+                        logger_debug('      _match_chunks: ==>matched_length, qstart:', matched_length, qstart)
+                    qspans = [Span(qstart, qstart + matched_length - 1)]
+                    ispans = [Span(istart, istart + matched_length - 1)]
                     match = LicenseMatch(rule, qspans, ispans, line_by_pos, _type=MATCH_TYPE)
                     if DEBUG:
                         logger_debug('        _match_chunks: appending match:', match)
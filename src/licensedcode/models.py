@@ -24,6 +24,7 @@
 
 from __future__ import print_function, absolute_import
 
+from array import array
 import codecs
 from collections import defaultdict
 from collections import OrderedDict
@@ -306,7 +307,7 @@ class Rule(object):
     """
     # OPTMIZED: use slot to increase attribute access speed wrt. namedtuple
     __slots__ = ('rid', 'licenses', 'license_choice', 'notes', 'data_file',
-                 'text_file', '_text', 'length', 'gaps', 'gaps_count')
+                 'text_file', '_text', 'length', '_gaps', 'gaps_count')
 
     def __init__(self, data_file=None, text_file=None, licenses=None,
                  license_choice=False, notes=None, _text=None):
@@ -335,33 +336,44 @@ class Rule(object):
         # length in number of tokens
         self.length = 0
 
-        # set of pos followed by a gap, aka a template region
-        self.gaps = set()
+        # OPTIMIZED: compact sorted array of pos followed by a gap, aka a
+        # template region. Use the gaps property to get a set.
+        self._gaps = array('h')
         self.gaps_count = 0
 
-    def tokens(self, lower=True):
+    @property
+    def gaps(self):
+        """
+        Return a set of the positions followed by a gap.
+        """
+        # Note: a new set is built on each access: this is used only when
+        # computing the index starters and in tests, not when matching.
+        return set(self._gaps)
+
+    def tokens(self, lower=True, _cache=None):
         """
         Return an iterable of tokens and keep track of gaps by position. Gaps
         and length are recomputed. Tokens inside gaps are tracked but not part
         of the returned stream.
+
+        `_cache` is an optional mapping of (text, lower) -> (tokens, gaps)
+        shared by the caller to tokenize identical rule texts only once when
+        processing a batch of rules.
         """
-        gaps = set()
-        # Note: we track the pos instead of enumerating it because we create
-        # positions abstracting gaps
-        pos = 0
-        length = 0
-        for token in rule_tokenizer(self.text(), lower=lower):
-            if token is None:
-                gaps.add(pos - 1)
-            else:
-                length += 1
-                yield token
-                # only increment pos if we are not in a gap
-                pos += 1
-
-        self.length = length
-        self.gaps = gaps
+        text = self.text()
+        if _cache is None:
+            tokens, gaps = _tokenize(text, lower)
+        else:
+            key = text, lower
+            cached = _cache.get(key)
+            if cached is None:
+                cached = _cache[key] = _tokenize(text, lower)
+            tokens, gaps = cached
+        self.length = len(tokens)
+        # the tokenized gaps tuple may be shared: each rule gets its own array
+        self._gaps = array('h', gaps)
         self.gaps_count = len(gaps)
+        return iter(tokens)
 
     def text(self):
         """
@@ -409,12 +421,12 @@ class Rule(object):
         """
         return not self.licenses
 
-    def _data(self):
+    def _data(self, _cache=None):
         """
         Return a tuple of data used to check for uniqueness.
         """
-        comparable = list(self.tokens())
-        comparable.extend(sorted(self.gaps))
+        comparable = list(self.tokens(_cache=_cache))
+        comparable.extend(self._gaps)
         comparable.append(self.license_choice)
         comparable.extend(sorted(self.licenses))
         return tuple(comparable)
@@ -471,6 +483,27 @@ class Rule(object):
         return self
 
 
+def _tokenize(text, lower=True):
+    """
+    Return a tuple of (tokens tuple, gaps tuple) for a rule `text`. Gaps are
+    tracked by the sorted positions of the tokens followed by a gap.
+    """
+    tokens = []
+    tokens_append = tokens.append
+    gaps = []
+    # Note: we track the pos instead of enumerating it because we create
+    # positions abstracting gaps
+    pos = 0
+    for token in rule_tokenizer(text, lower=lower):
+        if token is None:
+            gaps.append(pos - 1)
+        else:
+            tokens_append(token)
+            # only increment pos if we are not in a gap
+            pos += 1
+    return tuple(tokens), tuple(gaps)
+
+
 class MissingLicense(Exception):
     pass
 
@@ -499,8 +532,10 @@ def unique_rules(rules):
     Yield an iterable of unique rules given an iterable of rules.
     """
     seen = {}
+    # tokenize identical rule texts only once
+    tokens_cache = {}
     for rule in rules:
-        ridt = rule._data()
+        ridt = rule._data(_cache=tokens_cache)
         if ridt in seen:
             print(rule.identifier(), 'is a duplicate of', seen[ridt])
             continue
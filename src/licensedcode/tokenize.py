@@ -59,46 +59,33 @@ template_splitter = re.compile(r'''
     |
     # a template region is anything enclosed in double braces
     (?:{{[^{}]*}})
-''' , re.UNICODE | re.VERBOSE).findall
+''' , re.UNICODE | re.VERBOSE).finditer
 
 
 def rule_tokenizer(text, lower=True):
     """
-    Return a sequence of tokens from a unicode rule text returning templated
+    Return an iterable of tokens from a unicode rule text returning templated
     regions as a None token. Leading and trailing templated regions are skipped.
+    Contiguous templated regions are returned as a single None token.
     """
-    if  text:
-        text = lower and text.lower() or text
-        tokens = template_splitter(text)
-        # replace templates with None
-        tokens = [None if token.startswith(u'{') else token for token in tokens]
-
-        # remove leading and trailing template templates
-        while tokens and tokens[0] is None:
-            del tokens[0]
-        while tokens and tokens[-1] is None:
-            del tokens[-1]
-
-        # remove contiguous templates
-        prev = -1
-        for token in tokens:
-            if prev == -1:
-                prev = token
-                if token:
-                    yield token
-                    prev = token
-                continue
-
-            if token:
-                yield token
-                prev = token
-
-            else:
-                if prev is None and token is None:
-                    continue
-                else:
-                    yield token
-                    prev = token
+    if not text:
+        return
+    text = lower and text.lower() or text
+    # True once a regular token has been returned
+    started = False
+    # True if a gap must be returned before the next regular token: this
+    # skips leading and trailing templates and merges contiguous templates
+    in_gap = False
+    for match in template_splitter(text):
+        token = match.group()
+        if token.startswith(u'{'):
+            in_gap = started
+            continue
+        if in_gap:
+            yield None
+            in_gap = False
+        started = True
+        yield token
 
 
 def ngrams(iterable, ngram_length):
@@ -0,0 +1,71 @@
+#
+# Copyright (c) 2015 nexB Inc. and others. All rights reserved.
+# http://nexb.com and https://github.com/nexB/scancode-toolkit/
+# The ScanCode software is licensed under the Apache License version 2.0.
+# Data generated with ScanCode require an acknowledgment.
+# ScanCode is a trademark of nexB Inc.
+#
+# You may not use this software except in compliance with the License.
+# You may obtain a copy of the License at: http://apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+#
+# When you publish or redistribute any data created with ScanCode or any ScanCode
+# derivative work, you must accompany this data with the following acknowledgment:
+#
+#  Generated with ScanCode and provided on an "AS IS" BASIS, WITHOUT WARRANTIES
+#  OR CONDITIONS OF ANY KIND, either express or implied. No content created from
+#  ScanCode should be considered or used as legal advice. Consult an Attorney
+#  for any legal advice.
+#  ScanCode is a free software code scanning tool from nexB Inc. and others.
+#  Visit https://github.com/nexB/scancode-toolkit/ for support and download.
+
+from __future__ import absolute_import, print_function
+
+import io
+import json
+import os
+import sys
+
+from licensedcode import saneyaml
+
+
+"""
+Convert the YAML data files of the data-driven license detection tests to JSON
+data files. JSON data files are faster to load and are used instead of the YAML
+data files when both exist.
+
+Usage: python tests/licensedcode/migrate_yaml_to_json.py [test data directory]
+"""
+
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data/licenses')
+
+
+def migrate(test_dir=TEST_DATA_DIR):
+    """
+    Write a .yml.json data file for each .yml data file in `test_dir`. Return
+    the number of converted files.
+    """
+    converted = 0
+    for top, _, files in os.walk(test_dir):
+        for yfile in files:
+            if not yfile.endswith('.yml'):
+                continue
+            yaml_file = os.path.join(top, yfile)
+            with io.open(yaml_file, encoding='utf-8') as df:
+                data = saneyaml.load(df.read())
+
+            json_file = yaml_file + '.json'
+            with open(json_file, 'wb') as jf:
+                json.dump(data, jf, indent=2, separators=(',', ': '))
+            converted += 1
+    return converted
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    test_dir = args and args[0] or TEST_DATA_DIR
+    print('Converted', migrate(test_dir), 'YAML data files to JSON in:', test_dir)
@@ -24,40 +24,139 @@
 
 from __future__ import absolute_import, print_function
 
-import codecs
 from collections import OrderedDict
+import cPickle
+from hashlib import md5
+import io
+from itertools import chain
+import json
 import os
 from os.path import abspath
+from os.path import exists
 from os.path import join
+import tempfile
+import types
 import unittest
 from unittest.case import expectedFailure
+from unittest.case import skipIf
+import zlib
 
 from commoncode import fileutils
-from commoncode import functional
 from commoncode import text
+from commoncode.system import on_windows
+from commoncode.testcase import FileBasedTesting
 
+from licensedcode import cache_dir
 from licensedcode import saneyaml
 from licensedcode import index
 
 
 TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data/licenses')
 
+# pickled YAML test data are cached here, outside of the test data tree
+TEST_CACHE_DIR = join(cache_dir, 'license_tests')
+
+# Tests can be split in shards to run in multiple processes, each running one
+# shard. For instance to run the second of four shards:
+#  SCANCODE_TEST_SHARD_INDEX=1 SCANCODE_TEST_SHARD_COUNT=4 py.test ...
+SHARD_INDEX = int(os.environ.get('SCANCODE_TEST_SHARD_INDEX', 0))
+SHARD_COUNT = int(os.environ.get('SCANCODE_TEST_SHARD_COUNT', 1))
+
+# Test functions are built and attached at import time unless disabled such
+# that tools importing these modules without running tests (linters, IDE
+# discovery) do not pay the price of loading all the tests data:
+#  SCANCODE_COLLECT_TESTS=0 ...
+COLLECT_TESTS = os.environ.get('SCANCODE_COLLECT_TESTS', '1') == '1'
+
+# JSON test data files use this distinct suffix such that any other .json file
+# is treated as a test file to scan (such as a package.json)
+JSON_DATA_SUFFIX = '.yml.json'
+
 
 """
-Data-driven tests using expectations stored in YAML files.
+Data-driven tests using expectations stored in YAML or JSON files.
 """
 
 
+# global in-memory cache of parsed YAML test data as a mapping of
+# data file path -> (modification time, data)
+_YAML_DATA_BY_PATH = {}
+
+
+def _load_yaml_cached(location, tests_cache_dir=TEST_CACHE_DIR):
+    """
+    Return the data loaded from the YAML file at `location`.
+
+    Parsing YAML is slow: the parsed data are cached in memory for this process
+    and pickled on disk in `tests_cache_dir` for subsequent runs. A cached
+    entry is used only if it was saved for the current modification time of the
+    YAML file. Failing to read or write the disk cache is not an error.
+
+    Pickles are keyed by the path of the YAML file relative to TEST_DATA_DIR
+    such that the cache does not grow with each new checkout or absolute path
+    of the same test data.
+    """
+    mtime = os.stat(location).st_mtime
+    cached = _YAML_DATA_BY_PATH.get(location)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    cache_key = os.path.relpath(location, TEST_DATA_DIR)
+    cache_file = join(tests_cache_dir, md5(cache_key).hexdigest() + '.pkl')
+    cached = None
+    if exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as cf:
+                cached = cPickle.load(cf)
+        except Exception:
+            # a corrupted or incompatible cache is just ignored and rebuilt
+            cached = None
+
+    if not cached or cached[0] != mtime:
+        with io.open(location, encoding='utf-8') as df:
+            data = saneyaml.load(df.read())
+        cached = mtime, data
+        _save_cache(cached, cache_file, tests_cache_dir)
+
+    _YAML_DATA_BY_PATH[location] = cached
+    return cached[1]
+
+
+def _save_cache(cached, cache_file, tests_cache_dir):
+    """
+    Pickle `cached` data to `cache_file` in `tests_cache_dir`. Errors are
+    ignored, such as with a read-only checkout: the data are then only cached
+    in memory and no temp file is left behind.
+    """
+    tmp_file = None
+    try:
+        # write to a temp file then rename to ensure that a concurrent test
+        # process never sees a partially written cache file
+        if not exists(tests_cache_dir):
+            fileutils.create_dir(tests_cache_dir)
+        fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=tests_cache_dir)
+        with os.fdopen(fd, 'wb') as tf:
+            cPickle.dump(cached, tf, protocol=cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_file, cache_file)
+    except Exception:
+        if tmp_file and exists(tmp_file):
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+
+
 class LicenseTest(object):
     """
     A license detection test is used to verify that license detection works
     correctly
 
-    It consists of two files with the same base name: a .yml file with test data
-    and a test file with any other extension that needs to be tested for
-    detection
+    It consists of two files with the same base name: a .yml or .yml.json file
+    with test data and a test file with any other extension that needs to be
+    tested for detection. JSON test data are faster to load than YAML and are
+    used if both exist.
 
-    The following data are loaded from the .yml file:
+    The following data are loaded from the .yml or .yml.json file:
      - a test file to scan for licenses,
      - a list of expected licenses (with optional positions) to detect,
      - optional notes.
@@ -67,15 +166,14 @@ class LicenseTest(object):
     If the list of licenses is empty, then this test should not detect any
     license in the test file.
     """
-    def __init__(self, data_file=None, test_file=None):
+    def __init__(self, data_file=None, test_file=None, tests_cache_dir=TEST_CACHE_DIR):
         self.data_file = data_file
         self.test_file = test_file
         if self.test_file:
             self.test_file_name = fileutils.file_name(test_file)
 
         if self.data_file:
-            with codecs.open(data_file, mode='rb', encoding='utf-8') as df:
-                data = saneyaml.load(df.read())
+            data = self._load_data(data_file, tests_cache_dir)
 
         self.licenses = data.get('licenses', [])
         # TODO: this is for future support of license expressions
@@ -83,6 +181,17 @@ class LicenseTest(object):
         self.notes = data.get('notes')
         self.expected_failure = data.get('expected_failure', False)
 
+    @staticmethod
+    def _load_data(location, tests_cache_dir=TEST_CACHE_DIR):
+        """
+        Return the test data loaded from the JSON or YAML file at `location`.
+        Parsed YAML data are cached in `tests_cache_dir`.
+        """
+        if location.endswith(JSON_DATA_SUFFIX):
+            with open(location, 'rb') as df:
+                return json.load(df, object_pairs_hook=OrderedDict)
+        return _load_yaml_cached(location, tests_cache_dir)
+
     def asdict(self):
         dct = OrderedDict()
         if self.licenses:
@@ -96,48 +205,99 @@ class LicenseTest(object):
     def dump(self):
         """
         Dump a representation of self to tgt_dir using two files:
-         - a .yml for the rule data in YAML block format
+         - a .yml for the rule data in YAML block format or a .yml.json for
+           the rule data in JSON, based on the data_file extension
          - a .RULE: the rule text as a UTF-8 file
         """
+        if self.data_file.endswith(JSON_DATA_SUFFIX):
+            with open(self.data_file, 'wb') as df:
+                json.dump(self.asdict(), df, indent=2, separators=(',', ': '))
+            return
+
         as_yaml = saneyaml.dump(self.asdict())
-        with codecs.open(self.data_file, 'wb', encoding='utf-8') as df:
+        with io.open(self.data_file, 'w', encoding='utf-8', newline='\n') as df:
             df.write(as_yaml)
 
 
-def load_license_tests(test_dir=TEST_DATA_DIR):
+def _scan(test_dir):
+    """
+    Yield tuples of (base_name, extension, path) for each file in the
+    `test_dir` directory tree. The extension does not include the dot.
+    """
+    dirs = [test_dir]
+    while dirs:
+        top = dirs.pop()
+        for name in os.listdir(top):
+            path = join(top, name)
+            if os.path.isdir(path):
+                # like os.walk, do not follow symlinked directories
+                if not os.path.islink(path):
+                    dirs.append(path)
+                continue
+            base_name, dot, extension = name.rpartition('.')
+            if not dot:
+                base_name, extension = name, ''
+            yield base_name, extension, path
+
+
+def load_license_tests(test_dir=TEST_DATA_DIR, tests_cache_dir=TEST_CACHE_DIR):
     """
     Yield an iterable of LicenseTest loaded from test data files in test_dir.
+    Parsed YAML test data are cached in `tests_cache_dir`.
     """
-    # first collect files with .yml extension and files with other extensions
-    # in two  maps keyed by file base_name
+    # the scanned file paths are absolute if the scanned directory is absolute
+    test_dir = abspath(test_dir)
+
+    # first collect files with .yml or .yml.json extension and files with
+    # other extensions in maps keyed by file base_name
     data_files = {}
+    json_files = {}
     test_files = {}
-    for top, _, files in os.walk(test_dir):
-        for yfile in files:
-            base_name = fileutils.file_base_name(yfile)
-            file_path = abspath(join(top, yfile))
-            if yfile.endswith('.yml'):
-                assert base_name not in data_files
-                data_files[base_name] = file_path
-            else:
-                assert base_name not in test_files
-                test_files[base_name] = file_path
+    for base_name, extension, file_path in _scan(test_dir):
+        if extension == 'yml':
+            assert base_name not in data_files
+            data_files[base_name] = file_path
+        elif extension == 'json' and base_name.endswith('.yml'):
+            base_name = base_name[:-len('.yml')]
+            assert base_name not in json_files
+            json_files[base_name] = file_path
+        else:
+            assert base_name not in test_files
+            test_files[base_name] = file_path
+
+    # use JSON data files rather than YAML when both exist
+    data_files.update(json_files)
 
     # ensure that each data file has a corresponding test file
-    diff = set(data_files.keys()).symmetric_difference(set(test_files.keys()))
+    diff = data_files.viewkeys() ^ test_files.viewkeys()
     assert not diff
 
     # second, create pairs of a data_file and the corresponding test file
     # that have the same base_name
     for base_name, data_file in data_files.items():
         test_file = test_files[base_name]
-        yield LicenseTest(data_file, test_file)
+        yield LicenseTest(data_file, test_file, tests_cache_dir)
 
 
-def build_tests(license_tests, clazz):
+def in_shard(test_name, shard_index=SHARD_INDEX, shard_count=SHARD_COUNT):
+    """
+    Return True if the test named `test_name` belongs to the `shard_index`
+    shard out of `shard_count` shards. Tests are assigned to a shard based on
+    a stable checksum of their name. Raise an Exception if `shard_index` is not
+    a valid shard index: a misconfigured shard would otherwise run no tests.
+    """
+    if not 0 <= shard_index < shard_count:
+        raise Exception('Invalid test shard index: %(shard_index)r for %(shard_count)r shards.' % locals())
+    if shard_count <= 1:
+        return True
+    return (zlib.crc32(test_name) & 0xffffffff) % shard_count == shard_index
+
+
+def build_tests(license_tests, clazz, idx):
     """
     Dynamically build test methods from a sequence of LicenseTest and attach
-    these method to the clazz test class.
+    these method to the clazz test class. The tests use the `idx` license
+    index.
     """
     for test in license_tests:
         # absolute path
@@ -145,8 +305,10 @@ def build_tests(license_tests, clazz):
         tf = test.test_file
         test_name = 'test_detection_%(tfn)s' % locals()
         test_name = text.python_safe_name(test_name)
-        # closure on the test params
-        test_method = make_license_test_function(test.licenses, tf, test_name)
+        if not in_shard(test_name):
+            continue
+        # a function sharing the code of data_driven_test_function
+        test_method = make_license_test_function(test.licenses, tf, test_name, idx=idx)
 
         if test.expected_failure:
             test_method = expectedFailure(test_method)
@@ -156,38 +318,183 @@ def build_tests(license_tests, clazz):
 
 def flat_keys(matches):
     """
-    Return a flattened list of detected license keys, sorted by position and then rule order.
+    Return a flattened tuple of detected license keys, sorted by position and then rule order.
     """
-    return functional.flatten(match.rule.licenses for match in matches)
+    return tuple(chain.from_iterable(match.rule.licenses for match in matches))
 
 
-def make_license_test_function(expected_licenses, test_file, test_name, min_score=100, check_negative=True):
+def data_driven_test_function(self, expected_licenses=None, test_file=None, min_score=100, check_negative=True, idx=None):
+    """
+    Test that the detected licenses in `test_file` are the `expected_licenses`
+    tuple of license keys.
+    Used as the shared code of all the test functions built with
+    make_license_test_function(): the test arguments are passed as defaults.
     """
-    Build a test function closing on tests arguments
+    matches = idx.match(location=test_file, min_score=min_score, _check_negative=check_negative)
+    # the detected license is the first member of the returned tuple
+    license_result = flat_keys(matches)
+    if expected_licenses != license_result:
+        # on failure, we compare against more result data to get additional
+        # failure details, including the test_file and full match details
+        assert list(expected_licenses) == failure_details(idx, matches, license_result, test_file)
+
+
+def failure_details(idx, matches, license_result, test_file):
+    """
+    Return a list of details for a failed detection of `license_result` from
+    the `matches` of the `test_file` with the `idx` index: the test_file, the
+    detected licenses and each match with its query and index texts.
+    """
+    from licensedcode.query import get_texts
+    dictionary = idx.dictionary
+    matches_with_qtexts = []
+    for m in matches:
+        qtext, itext = get_texts(m, location=test_file, dictionary=dictionary, width=80)
+        matches_with_qtexts.append((m, qtext.splitlines(), m.qspans, itext.splitlines(), m.ispans,))
+    return ['test file: ' + test_file] + [repr(license_result)] + matches_with_qtexts
+
+
+def make_license_test_function(expected_licenses, test_file, test_name, min_score=100, check_negative=True, idx=None):
+    """
+    Build a test function named `test_name` for tests arguments. All the built
+    test functions share the code of data_driven_test_function and differ only
+    by their name and default arguments values, rather than each being a
+    closure. The `idx` license index is bound once as a default argument.
     """
     if not isinstance(expected_licenses, list):
         expected_licenses = [expected_licenses]
+    # compared as-is to the flat_keys() tuple of each test run
+    expected = tuple(expected_licenses)
 
-    def data_driven_test_function(self):
-        idx = index.get_index()
-        matches = idx.match(location=test_file, min_score=min_score, _check_negative=check_negative)
-        # the detected license is the first member of the returned tuple
-        license_result = flat_keys(matches)
-        try:
-            assert expected_licenses == license_result
-        except:
-            # on failure, we compare against more result data to get additional
-            # failure details, including the test_file and full match details
-            from licensedcode.query import get_texts
-            matches_with_qtexts = []
-            for m in matches:
-                qtext, itext = get_texts(m, location=test_file, dictionary=idx.dictionary, width=80)
-                matches_with_qtexts.append((m, qtext.splitlines(), m.qspans, itext.splitlines(), m.ispans,))
-            assert expected_licenses == ['test file: ' + test_file] + [repr(license_result)] + matches_with_qtexts
-
-    data_driven_test_function.__name__ = test_name
-    data_driven_test_function.funcname = test_name
-    return data_driven_test_function
+    return as_test_function(data_driven_test_function, test_name, expected, test_file, min_score, check_negative, idx)
+
+
+def as_test_function(func, test_name, *defaults):
+    """
+    Return a new function named `test_name` using the code and globals of
+    `func` with its arguments (except for `self`) defaulting to `defaults`.
+    """
+    test_function = types.FunctionType(func.__code__, func.__globals__, test_name, defaults)
+    test_function.funcname = test_name
+    return test_function
+
+
+class TestLoadYamlCached(FileBasedTesting):
+
+    def create_yaml(self, location, content):
+        with open(location, 'wb') as yml:
+            yml.write(content)
+
+    def test_load_yaml_cached_is_invalidated_when_the_yaml_file_is_modified(self):
+        test_cache_dir = self.get_temp_dir()
+        test_file = self.get_temp_file('yml')
+        self.create_yaml(test_file, 'licenses: [mit]\n')
+        os.utime(test_file, (1000, 1000))
+        assert {'licenses': ['mit']} == _load_yaml_cached(test_file, test_cache_dir)
+        assert 1 == len(os.listdir(test_cache_dir))
+
+        self.create_yaml(test_file, 'licenses: [bsd-new]\n')
+        os.utime(test_file, (2000, 2000))
+        assert {'licenses': ['bsd-new']} == _load_yaml_cached(test_file, test_cache_dir)
+
+        # the pickle cache is used when not cached in memory
+        _YAML_DATA_BY_PATH.pop(test_file)
+        self.create_yaml(test_file, 'licenses: [apache-2.0]\n')
+        os.utime(test_file, (2000, 2000))
+        assert {'licenses': ['bsd-new']} == _load_yaml_cached(test_file, test_cache_dir)
+
+    def test_load_yaml_cached_ignores_a_corrupted_cache(self):
+        test_cache_dir = self.get_temp_dir()
+        test_file = self.get_temp_file('yml')
+        self.create_yaml(test_file, 'licenses: [mit]\n')
+        cache_file = join(test_cache_dir, md5(os.path.relpath(test_file, TEST_DATA_DIR)).hexdigest() + '.pkl')
+        with open(cache_file, 'wb') as cf:
+            cf.write('not a pickle')
+        assert {'licenses': ['mit']} == _load_yaml_cached(test_file, test_cache_dir)
+
+        # the cache was rebuilt
+        _YAML_DATA_BY_PATH.pop(test_file)
+        with open(cache_file, 'rb') as cf:
+            assert {'licenses': ['mit']} == cPickle.load(cf)[1]
+
+    def test_load_yaml_cached_works_without_a_writable_cache(self):
+        # a file where a cache directory is expected cannot be written to
+        test_cache_dir = self.get_temp_file()
+        with open(test_cache_dir, 'wb') as tf:
+            tf.write('')
+        test_file = self.get_temp_file('yml')
+        self.create_yaml(test_file, 'licenses: [mit]\n')
+        assert {'licenses': ['mit']} == _load_yaml_cached(test_file, test_cache_dir)
+
+
+class TestLoadLicenseTests(FileBasedTesting):
+
+    def create_file(self, location, content):
+        with open(location, 'wb') as tf:
+            tf.write(content)
+
+    def test_load_license_tests_with_json_data_and_dump_roundtrip(self):
+        test_dir = self.get_temp_dir()
+        test_cache_dir = self.get_temp_dir()
+        self.create_file(join(test_dir, 'mit.yml.json'), '{"licenses": ["mit"]}')
+        self.create_file(join(test_dir, 'mit.txt'), 'MIT License')
+        # a .json without a .yml.json suffix is a test file to scan
+        self.create_file(join(test_dir, 'package.yml'), 'licenses: [bsd-new]\n')
+        self.create_file(join(test_dir, 'package.json'), '{"license": "BSD"}')
+
+        tests = sorted(load_license_tests(test_dir, test_cache_dir), key=lambda t: t.test_file)
+        _YAML_DATA_BY_PATH.pop(join(test_dir, 'package.yml'))
+        # YAML data are cached in the test cache dir
+        assert 1 == len(os.listdir(test_cache_dir))
+        assert [join(test_dir, 'mit.txt'), join(test_dir, 'package.json')] == [t.test_file for t in tests]
+        assert [join(test_dir, 'mit.yml.json'), join(test_dir, 'package.yml')] == [t.data_file for t in tests]
+        assert [['mit'], ['bsd-new']] == [t.licenses for t in tests]
+
+        json_test = tests[0]
+        json_test.licenses = ['mit', 'apache-2.0']
+        json_test.notes = 'some notes'
+        json_test.dump()
+        with open(json_test.data_file, 'rb') as df:
+            assert {'licenses': ['mit', 'apache-2.0'], 'notes': 'some notes'} == json.load(df)
+
+        reloaded = LicenseTest(json_test.data_file, json_test.test_file, test_cache_dir)
+        assert ['mit', 'apache-2.0'] == reloaded.licenses
+        assert 'some notes' == reloaded.notes
+
+    @skipIf(on_windows, 'Windows does not have (well supported) links.')
+    def test_scan_does_not_follow_symlinked_directories(self):
+        test_dir = self.get_temp_dir()
+        os.mkdir(join(test_dir, 'sub'))
+        self.create_file(join(test_dir, 'sub', 'mit.txt'), 'MIT License')
+        os.symlink(test_dir, join(test_dir, 'sub', 'loop'))
+        expected = [('mit', 'txt', join(test_dir, 'sub', 'mit.txt'))]
+        assert expected == list(_scan(test_dir))
+
+    def test_load_license_tests_prefers_json_data_over_yaml_data(self):
+        test_dir = self.get_temp_dir()
+        test_cache_dir = self.get_temp_dir()
+        self.create_file(join(test_dir, 'mit.yml'), 'licenses: [bsd-new]\n')
+        self.create_file(join(test_dir, 'mit.yml.json'), '{"licenses": ["mit"]}')
+        self.create_file(join(test_dir, 'mit.txt'), 'MIT License')
+        tests = list(load_license_tests(test_dir, test_cache_dir))
+        assert 1 == len(tests)
+        # the YAML data file is not loaded
+        assert [] == os.listdir(test_cache_dir)
+        assert ['mit'] == tests[0].licenses
+
+
+class TestInShard(unittest.TestCase):
+
+    def test_in_shard_assigns_each_test_to_exactly_one_shard(self):
+        test_names = ['test_detection_%d_txt' % i for i in range(100)]
+        for shard_count in (1, 2, 3, 7):
+            for test_name in test_names:
+                shards = [i for i in range(shard_count) if in_shard(test_name, i, shard_count)]
+                assert 1 == len(shards)
+
+    def test_in_shard_raises_on_invalid_shard_index(self):
+        for shard_index, shard_count in ((4, 4), (5, 4), (-1, 4), (0, 0)):
+            self.assertRaises(Exception, in_shard, 'test_detection_mit_txt', shard_index, shard_count)
 
 
 class TestLicenseDataDriven(unittest.TestCase):
@@ -195,4 +502,7 @@ class TestLicenseDataDriven(unittest.TestCase):
     pass
 
 
-build_tests(license_tests=load_license_tests(), clazz=TestLicenseDataDriven)
+if COLLECT_TESTS:
+    # the license index is loaded once only when the tests are built and is
+    # shared by all the tests
+    build_tests(license_tests=load_license_tests(), clazz=TestLicenseDataDriven, idx=index.get_index())
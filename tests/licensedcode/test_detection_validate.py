@@ -24,12 +24,20 @@
 
 from __future__ import absolute_import, print_function
 
+from collections import OrderedDict
+from hashlib import md5
 import os
 import unittest
 
 from commoncode import text
+from licensedcode import index
 from licensedcode import models
 
+from test_detection_datadriven import COLLECT_TESTS
+from test_detection_datadriven import as_test_function
+from test_detection_datadriven import failure_details
+from test_detection_datadriven import flat_keys
+from test_detection_datadriven import in_shard
 from test_detection_datadriven import make_license_test_function
 
 
@@ -37,23 +45,68 @@ from test_detection_datadriven import make_license_test_function
 Validate that each reference license texts is properly detected.
 """
 
-def build_tests(data_set, clazz):
+def build_tests(data_set, clazz, idx):
     """
     Dynamically build an individual test method for each license texts and spdx
     texts in a licenses `data_set` mapping attaching the test method to the
-    `clazz` test class.
+    `clazz` test class. The tests use the `idx` license index.
+
+    Identical texts shared by several licenses are tested only once.
     """
-    for license_key, license_obj in data_set.items():
+    # mapping of text checksum -> [test_name, test_file, [license_key, ...]]
+    tests_by_checksum = OrderedDict()
+    for license_key, license_obj in sorted(data_set.items()):
+        test_files = []
         if license_obj.text_file and os.path.exists(license_obj.text_file):
-            test_name = ('test_validate_detection_of_text_for_' + text.python_safe_name(license_key))
-            test_method = make_license_test_function(license_key, license_obj.text_file, test_name, min_score=100, check_negative=False)
-            setattr(clazz, test_name, test_method)
+            test_files.append(('test_validate_detection_of_text_for_', license_obj.text_file))
 
         if license_obj.spdx_license_key:
             if license_obj.spdx_file and os.path.exists(license_obj.spdx_file):
-                test_name = ('test_validate_detection_of_spdx_text_for_' + text.python_safe_name(license_key))
-                test_method = make_license_test_function(license_key, license_obj.spdx_file, test_name, min_score=100, check_negative=False)
-                setattr(clazz, test_name, test_method)
+                test_files.append(('test_validate_detection_of_spdx_text_for_', license_obj.spdx_file))
+
+        for test_name_prefix, test_file in test_files:
+            with open(test_file, 'rb') as tf:
+                checksum = md5(tf.read()).digest()
+            existing = tests_by_checksum.get(checksum)
+            if existing:
+                existing[2].append(license_key)
+                continue
+            test_name = test_name_prefix + text.python_safe_name(license_key)
+            tests_by_checksum[checksum] = [test_name, test_file, [license_key]]
+
+    # license texts are detected exactly without checking negative rules
+    min_score = 100
+    check_negative = False
+    for test_name, test_file, license_keys in tests_by_checksum.values():
+        if not in_shard(test_name):
+            continue
+        if len(license_keys) == 1:
+            test_method = make_license_test_function(license_keys[0], test_file, test_name, min_score, check_negative, idx)
+        else:
+            test_method = make_shared_text_test_function(license_keys, test_file, test_name, min_score, check_negative, idx)
+        setattr(clazz, test_name, test_method)
+
+
+def shared_text_test_function(self, expected=None, test_file=None, min_score=100, check_negative=True, idx=None):
+    """
+    Test that a `test_file` text shared by several licenses is detected as
+    exactly one of the `expected` tuples of one license key.
+    """
+    matches = idx.match(location=test_file, min_score=min_score, _check_negative=check_negative)
+    license_result = flat_keys(matches)
+    if license_result not in expected:
+        # on failure, we compare against more result data to get additional
+        # failure details, including the test_file and full match details
+        assert list(expected) == failure_details(idx, matches, license_result, test_file)
+
+
+def make_shared_text_test_function(license_keys, test_file, test_name, min_score=100, check_negative=True, idx=None):
+    """
+    Build a test function for a `test_file` text shared by several licenses:
+    this text must be detected as exactly one of the `license_keys` licenses.
+    """
+    expected = tuple((license_key,) for license_key in license_keys)
+    return as_test_function(shared_text_test_function, test_name, expected, test_file, min_score, check_negative, idx)
 
 
 class TestValidateLicenseTextDetection(unittest.TestCase):
@@ -61,4 +114,5 @@ class TestValidateLicenseTextDetection(unittest.TestCase):
     pass
 
 
-build_tests(data_set=models.get_licenses_by_key(), clazz=TestValidateLicenseTextDetection)
+if COLLECT_TESTS:
+    build_tests(data_set=models.get_licenses_by_key(), clazz=TestValidateLicenseTextDetection, idx=index.get_index())
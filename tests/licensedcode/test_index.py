@@ -85,6 +85,16 @@ class TestIndexing(IndexTesting):
         keys = chain(*[ridx.keys() for ridx in idx.postings_by_rid])
         assert 137 == len(set(keys))
 
+    def test__add_rules_builds_start_ngrams_inverted_index(self):
+        test_rules = self.get_test_rules('index/bsd_templates2')
+        idx = index.LicenseIndex()
+        idx._add_rules(test_rules)
+        for rid, rid_starters in enumerate(idx.start_ngrams_by_rid):
+            for starter_ngram in rid_starters:
+                assert rid in idx.rids_by_start_ngram[starter_ngram]
+        expected = sum(len(rid_starters) for rid_starters in idx.start_ngrams_by_rid)
+        assert expected == sum(len(rids) for rids in idx.rids_by_start_ngram.values())
+
     def test_index_internals_with__add_rules(self):
         base = self.get_test_loc('index/tokens_count')
         keys = sorted(os.listdir(base))
@@ -27,6 +27,7 @@ from __future__ import absolute_import, print_function
 import os
 
 from commoncode.testcase import FileBasedTesting
+from commoncode.testcase import get_test_loc
 from licensedcode import models
 
 
@@ -36,9 +37,14 @@ TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 class TestLicense(FileBasedTesting):
     test_data_dir = TEST_DATA_DIR
 
+    @classmethod
+    def setUpClass(cls):
+        # test licenses are loaded once for all the tests of this class
+        test_dir = get_test_loc('models/licenses', cls.test_data_dir)
+        cls.licenses = models.load_licenses(test_dir)
+
     def test_load_license(self):
-        test_dir = self.get_test_loc('models/licenses')
-        lics = models.load_licenses(test_dir)
+        lics = self.licenses
         # one license is obsolete and not loaded
         expected = [u'apache-2.0', u'bsd-ack-carrot2', u'w3c-docs-19990405']
         assert expected == sorted(lics.keys())
@@ -48,14 +54,12 @@ class TestLicense(FileBasedTesting):
         assert '1994-2002 World Wide Web Consortium' in lics[u'w3c-docs-19990405'].text
 
     def test_get_texts(self):
-        test_dir = self.get_test_loc('models/licenses')
-        lics = models.load_licenses(test_dir)
+        lics = self.licenses
         for lic in lics.values():
             assert 'distribut' in lic.text.lower()
 
     def test_rules_from_licenses(self):
-        test_dir = self.get_test_loc('models/licenses')
-        lics = models.load_licenses(test_dir)
+        lics = self.licenses
         rules = list(models.rules_from_licenses(lics))
         assert 4 == len(rules)
         for rule in rules:
@@ -110,6 +114,16 @@ class TestRule(FileBasedTesting):
         r2 = models.Rule(_text='Some text', license_choice=True)
         assert r1._data() != r2._data()
 
+    def test_rule_tokens_with_cache_tokenize_identical_texts_once(self):
+        tokens_cache = {}
+        r1 = models.Rule(_text='Some {{gap}} text')
+        r2 = models.Rule(_text='Some {{gap}} text')
+        assert ['some', 'text'] == list(r1.tokens(_cache=tokens_cache))
+        assert ['some', 'text'] == list(r2.tokens(_cache=tokens_cache))
+        assert 1 == len(tokens_cache)
+        assert set([0]) == r2.gaps
+        assert 2 == r2.length
+
     def test_rule_len_is_computed_correctly(self):
         test_text = '''zero one two three
             four {{gap1}}